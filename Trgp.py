@@ -1,55 +1,414 @@
 import urllib.request
+import urllib.error
 import json
 import time
 import socket
+import os
+import ipaddress
+
+# Optional offline geolocation database support
+try:
+    import maxminddb
+except ImportError:
+    maxminddb = None
+
+# Optional pooled HTTP client with keep-alive support
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+# Optional fast JSON parser
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _loads(raw):
+    """
+    Decode a raw JSON response body, using orjson when available
+    
+    Args:
+        raw (bytes): Raw response body
+    
+    Returns:
+        dict: Decoded JSON document
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+def _status_code(error):
+    """
+    Extract the HTTP status code from a urllib or requests error
+    
+    Args:
+        error (Exception): Error raised by an HTTP request
+    
+    Returns:
+        int: HTTP status code or None if the error has no response
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
 
 class LocationTracker:
-    def __init__(self, log_file='location_log.txt'):
+    def __init__(self, log_file='location_log.txt', cache_file='location_cache.json', cache_ttl=3600,
+                 geoip_db='GeoLite2-City.mmdb', token=None):
         """
         Initialize the Location Tracker with basic configuration
         
         Args:
             log_file (str): Path to the log file for storing location data
+            cache_file (str): Path to the JSON file caching geolocation lookups
+            cache_ttl (int): Seconds a cached lookup stays valid
+            geoip_db (str): Path to an offline MaxMind/IP2Location MMDB database
+            token (str): ipinfo.io API token, required for batch lookups and
+                used for single lookups when set
         """
         self.log_file = log_file
         self.location_data = []
+        self._cache_file = cache_file
+        self.cache_ttl = cache_ttl
+        self._cache = self._load_cache()
+        self.reader = self._open_geoip_database(geoip_db)
+        self.session = self._create_session()
+        self.token = token
+
+    def _create_session(self):
+        """
+        Create a pooled HTTP session so repeated lookups reuse connections
+        
+        Returns:
+            requests.Session: Keep-alive session or None if requests is unavailable
+        """
+        if requests is None:
+            return None
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
-    def get_ip_location(self):
+    def _fetch_json(self, url, timeout=5):
         """
-        Retrieve approximate location based on IP address using external service
+        Fetch and decode a JSON document over HTTP
+        
+        Args:
+            url (str): URL to fetch
+            timeout (int): Request timeout in seconds
+        
+        Returns:
+            dict: Decoded JSON response
+        """
+        if self.session:
+            response = self.session.get(url, timeout=timeout)
+            response.raise_for_status()
+            return _loads(response.content)
+        
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return _loads(response.read())
+
+    def _fetch_with_retry(self, url, attempts=3, backoff=0.5, max_wait=5):
+        """
+        Fetch JSON, retrying transient failures with exponential backoff
+        
+        Connection errors and 5xx responses are retried; rate limiting (429)
+        and other client errors are raised immediately.
+        
+        Args:
+            url (str): URL to fetch
+            attempts (int): Maximum number of attempts
+            backoff (float): Initial wait between attempts in seconds
+            max_wait (float): Upper bound on the wait between attempts
+        
+        Returns:
+            dict: Decoded JSON response
+        """
+        for attempt in range(attempts):
+            try:
+                return self._fetch_json(url)
+            except OSError as e:
+                status = _status_code(e)
+                if (status is not None and status < 500) or attempt == attempts - 1:
+                    raise
+                time.sleep(min(backoff * 2 ** attempt, max_wait))
+
+    def _fallback_ip2location(self, ip=None):
+        """
+        Look up a location through ip2location.io when ipinfo.io is rate limited
+        
+        Args:
+            ip (str): IP address to locate, defaults to this machine's public IP
         
         Returns:
             dict: Location information or None if retrieval fails
         """
+        url = f'https://api.ip2location.io/?ip={ip}' if ip else 'https://api.ip2location.io/'
         try:
-            # Use a public IP geolocation service
-            with urllib.request.urlopen('https://ipinfo.io/json') as response:
-                data = json.loads(response.read().decode('utf-8'))
-                
-                # Extract location information
-                location_info = {
-                    'timestamp': time.time(),
-                    'ip': data.get('ip', 'Unknown'),
-                    'city': data.get('city', 'Unknown'),
-                    'region': data.get('region', 'Unknown'),
-                    'country': data.get('country', 'Unknown'),
-                }
-                
-                # Try to parse coordinates if available
-                try:
-                    loc = data.get('loc', '0,0').split(',')
-                    location_info['latitude'] = float(loc[0])
-                    location_info['longitude'] = float(loc[1])
-                except (ValueError, IndexError):
-                    location_info['latitude'] = 0
-                    location_info['longitude'] = 0
-                
-                return location_info
+            data = self._fetch_with_retry(url)
+        except Exception as e:
+            print(f"Fallback location retrieval error: {e}")
+            return None
+        
+        return {
+            'timestamp': time.time(),
+            'ip': data.get('ip', 'Unknown'),
+            'city': data.get('city_name', 'Unknown'),
+            'region': data.get('region_name', 'Unknown'),
+            'country': data.get('country_code', 'Unknown'),
+            'latitude': data.get('latitude') or 0,
+            'longitude': data.get('longitude') or 0,
+        }
+
+    def _post_json(self, url, payload, timeout=10):
+        """
+        POST a JSON payload and decode the JSON response
+        
+        Args:
+            url (str): URL to post to
+            payload: JSON-serializable request body
+            timeout (int): Request timeout in seconds
+        
+        Returns:
+            dict: Decoded JSON response
+        """
+        if self.session:
+            response = self.session.post(url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return _loads(response.content)
+        
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return _loads(response.read())
+
+    def _open_geoip_database(self, geoip_db):
+        """
+        Open the offline geolocation database if it is available
+        
+        Args:
+            geoip_db (str): Path to the MMDB database file
         
+        Returns:
+            maxminddb.Reader: Database reader or None if unavailable
+        """
+        if maxminddb is None or not os.path.exists(geoip_db):
+            return None
+        try:
+            return maxminddb.open_database(geoip_db)
         except Exception as e:
-            print(f"Location retrieval error: {e}")
+            print(f"GeoIP database error: {e}")
             return None
 
+    def _load_cache(self):
+        """
+        Load cached geolocation lookups from disk
+        
+        Returns:
+            dict: Cached location records keyed by IP (or 'self')
+        """
+        try:
+            with open(self._cache_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        """
+        Atomically write the geolocation cache back to disk
+        """
+        tmp_file = self._cache_file + '.tmp'
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(self._cache, f)
+            os.replace(tmp_file, self._cache_file)
+        except OSError as e:
+            print(f"Location cache write error: {e}")
+
+    def _get_cached(self, key):
+        """
+        Return a cached location record if it has not expired
+        
+        Args:
+            key (str): Cache key (IP address or 'self')
+        
+        Returns:
+            dict: Cached location information or None
+        """
+        cached = self._cache.get(key)
+        if cached and time.time() - cached['timestamp'] < self.cache_ttl:
+            return cached
+        return None
+
+    def _lookup_local(self, ip):
+        """
+        Resolve an IP address against the offline geolocation database
+        
+        Args:
+            ip (str): IP address to look up
+        
+        Returns:
+            dict: Location information or None if the IP is not in the database
+        """
+        try:
+            record = self.reader.get(ip)
+        except ValueError:
+            return None
+        if not record:
+            return None
+
+        subdivisions = record.get('subdivisions') or [{}]
+        location = record.get('location', {})
+        return {
+            'timestamp': time.time(),
+            'ip': ip,
+            'city': record.get('city', {}).get('names', {}).get('en', 'Unknown'),
+            'region': subdivisions[0].get('names', {}).get('en', 'Unknown'),
+            'country': record.get('country', {}).get('iso_code', 'Unknown'),
+            'latitude': location.get('latitude', 0),
+            'longitude': location.get('longitude', 0),
+        }
+
+    def _parse_ipinfo(self, data):
+        """
+        Convert an ipinfo.io response into a location record
+        
+        Args:
+            data (dict): Decoded ipinfo.io JSON response
+        
+        Returns:
+            dict: Location information
+        """
+        # Extract location information
+        location_info = {
+            'timestamp': time.time(),
+            'ip': data.get('ip', 'Unknown'),
+            'city': data.get('city', 'Unknown'),
+            'region': data.get('region', 'Unknown'),
+            'country': data.get('country', 'Unknown'),
+        }
+        
+        # Try to parse coordinates if available
+        try:
+            loc = data.get('loc', '0,0').split(',')
+            location_info['latitude'] = float(loc[0])
+            location_info['longitude'] = float(loc[1])
+        except (ValueError, IndexError):
+            location_info['latitude'] = 0
+            location_info['longitude'] = 0
+        
+        return location_info
+
+    def get_ip_location(self, ip=None):
+        """
+        Retrieve approximate location based on IP address
+        
+        Uses the offline geolocation database when an IP is given and the
+        database is available, falling back to the external service.
+        
+        Args:
+            ip (str): IP address to locate, defaults to this machine's public IP
+        
+        Returns:
+            dict: Location information or None if retrieval fails
+        """
+        if ip and self.reader:
+            location_info = self._lookup_local(ip)
+            if location_info:
+                return location_info
+
+        cache_key = ip or 'self'
+        cached = self._get_cached(cache_key)
+        if cached:
+            return cached
+
+        try:
+            # Use a public IP geolocation service
+            url = f'https://ipinfo.io/{ip}/json' if ip else 'https://ipinfo.io/json'
+            if self.token:
+                url += f'?token={self.token}'
+            data = self._fetch_with_retry(url)
+            location_info = self._parse_ipinfo(data)
+        
+        except Exception as e:
+            if _status_code(e) != 429:
+                print(f"Location retrieval error: {e}")
+                return None
+            
+            # ipinfo.io quota exhausted, fail over to the backup provider
+            location_info = self._fallback_ip2location(ip)
+            if location_info is None:
+                return None
+        
+        # Cache the lookup to avoid hitting the service again
+        self._cache[cache_key] = location_info
+        self._save_cache()
+        
+        return location_info
+
+    def get_ip_locations(self, ips, batch_size=1000):
+        """
+        Retrieve locations for many IP addresses at once
+        
+        Resolves what it can from the offline database and cache, then looks up
+        the remaining public IPs through the ipinfo.io batch API so the whole
+        set costs one request per batch instead of one per IP.
+        
+        Args:
+            ips (list): IP addresses to locate
+            batch_size (int): Maximum IPs per batch request
+        
+        Returns:
+            dict: Location information keyed by IP address
+        """
+        locations = {}
+        pending = []
+
+        for ip in dict.fromkeys(ips):
+            try:
+                if not ipaddress.ip_address(ip).is_global:
+                    continue  # Private/LAN addresses have no geolocation
+            except ValueError:
+                continue
+
+            location_info = (self._lookup_local(ip) if self.reader else None) or self._get_cached(ip)
+            if location_info:
+                locations[ip] = location_info
+            else:
+                pending.append(ip)
+
+        if pending and not self.token:
+            print("ipinfo.io token required for batch lookups")
+            pending = []
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            try:
+                data = self._post_json(f'https://ipinfo.io/batch?token={self.token}', batch)
+            except Exception as e:
+                print(f"Batch location retrieval error: {e}")
+                continue
+
+            for ip in batch:
+                record = data.get(ip)
+                # Skip bogons and per-IP errors so they are retried rather than cached
+                if isinstance(record, dict) and ('loc' in record or 'country' in record):
+                    location_info = self._parse_ipinfo(record)
+                    self._cache[ip] = location_info
+                    locations[ip] = location_info
+
+        if pending:
+            self._save_cache()
+
+        self.location_data.extend(locations.values())
+        return locations
+
     def log_location(self, location_info):
         """
         Log location information to a text file
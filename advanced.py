@@ -7,19 +7,34 @@ import hashlib
 import re
 import sqlite3
 import logging
+import os
+import threading
+from collections import deque
 from typing import List, Dict, Optional
 
 # Machine Learning and Data Processing Imports
 try:
     import numpy as np
-    import pandas as pd
     from sklearn.ensemble import IsolationForest
-    from sklearn.preprocessing import StandardScaler
+    from sklearn.preprocessing import MaxAbsScaler
+    import joblib
+except ImportError:
+    print("Machine Learning libraries not fully installed. Some advanced features will be limited.")
+
+# Deep learning is optional; the LSTM autoencoder is skipped without it
+try:
     import tensorflow as tf
     from tensorflow.keras.models import Sequential
-    from tensorflow.keras.layers import Dense, LSTM
+    from tensorflow.keras.layers import Dense, LSTM, RepeatVector
 except ImportError:
-    print("Machine Learning libraries not fully installed. Some advanced features will be limited.")
+    tf = None
+    print("TensorFlow not installed. LSTM anomaly detection disabled.")
+
+# Optional GPU-accelerated Isolation Forest (RAPIDS cuML)
+try:
+    from cuml.ensemble import IsolationForest as GPUIsolationForest
+except ImportError:
+    GPUIsolationForest = None
 
 # Notification Imports
 try:
@@ -32,10 +47,19 @@ except ImportError:
 # Web Framework
 try:
     from flask import Flask, render_template, jsonify, request
-    import threading
 except ImportError:
     print("Web framework not installed.")
 
+# Per-device numeric features collected by each network scan
+FEATURE_COLUMNS = ['packets_sent', 'packets_received', 'unique_connections', 'avg_connection_time']
+
+# Rows of scan history needed before an anomaly model is saved (the forest's max_samples)
+MIN_TRAINING_ROWS = 256
+
+# LSTM rolling-window inference: scans per window, and windows scored per cycle
+LSTM_WINDOW = 12  # One hour of 5-minute scans
+LSTM_BATCH = 24
+
 class AdvancedMLDeviceTracker:
     def __init__(self, config_file='tracker_config.json'):
         """
@@ -77,6 +101,7 @@ class AdvancedMLDeviceTracker:
             return {
                 'network_subnets': ['192.168.1.0/24'],
                 'ml_anomaly_threshold': 0.95,
+                'model_file': 'iforest.joblib',
                 'notification_settings': {
                     'email': {
                         'enabled': False,
@@ -116,20 +141,148 @@ class AdvancedMLDeviceTracker:
         """
         Initialize multiple machine learning models for anomaly detection
         """
+        # Fitted (scaler, isolation_forest) pair, swapped as one unit on retrain
+        self.anomaly_model = None
+        
+        # True while the model was fitted on less than MIN_TRAINING_ROWS rows
+        self._bootstrap_model = True
+        
+        # Serializes model saves from the scan path and the retrain thread
+        self._model_save_lock = threading.Lock()
+        
         try:
-            # Isolation Forest for Anomaly Detection
-            self.isolation_forest = IsolationForest(
-                contamination=0.1,  # 10% expected anomalies
-                random_state=42
-            )
+            # Isolation Forest for Anomaly Detection (fails here without the ML libraries)
+            isolation_forest = self._create_isolation_forest()
+            self.anomaly_detection_enabled = True
             
-            # LSTM Autoencoder for Network Anomaly Detection
-            self.lstm_model = self._build_lstm_autoencoder()
-        
         except Exception as e:
             self.logger.error(f"ML Model Initialization Error: {e}")
-            self.isolation_forest = None
-            self.lstm_model = None
+            self.anomaly_detection_enabled = False
+        
+        # Reuse a previously trained model instead of retraining on startup
+        model_file = self.config.get('model_file', 'iforest.joblib')
+        if self.anomaly_detection_enabled and os.path.exists(model_file):
+            try:
+                saved_model = joblib.load(model_file)
+                self.anomaly_model = (saved_model['scaler'], saved_model['isolation_forest'])
+                self._bootstrap_model = False
+                isolation_forest = saved_model['isolation_forest']
+                self.logger.info(f"Loaded anomaly model from {model_file}")
+            except Exception as e:
+                # Unreadable or incompatible model: retrain from scan history instead
+                self.logger.error(f"Anomaly model load failed, retraining from history: {e}")
+        
+        if (self.anomaly_detection_enabled and GPUIsolationForest is not None
+                and isinstance(isolation_forest, GPUIsolationForest)):
+            self.logger.info("Using GPU Isolation Forest")
+        
+        # Recent scans used for periodic retraining (one day of 5-minute scans)
+        self._feature_history = deque(maxlen=288)
+        
+        self.lstm_model = None
+        if tf is not None:
+            try:
+                # LSTM Autoencoder for Network Anomaly Detection
+                self.lstm_model = self._build_lstm_autoencoder()
+                
+                # Compiled inference-only graph, reused across scans
+                self._lstm_infer = tf.function(self.lstm_model, jit_compile=True)
+                
+                # Preallocated ring of the last LSTM_BATCH sliding windows of scan summaries
+                self._ring = np.zeros((LSTM_BATCH, LSTM_WINDOW, len(FEATURE_COLUMNS)), dtype=np.float32)
+                self._ring_scans = 0
+                
+                # End-scan numbers of windows already reported as anomalous
+                self._reported_windows = set()
+            
+            except Exception as e:
+                self.logger.error(f"LSTM Model Initialization Error: {e}")
+                self.lstm_model = None
+
+    def _create_isolation_forest(self):
+        """
+        Create an unfitted Isolation Forest, on the GPU when cuML is available
+        
+        Returns:
+            Isolation Forest estimator
+        """
+        if GPUIsolationForest is not None:
+            # cuML mirrors the sklearn fit/decision_function API and builds trees on the GPU
+            return GPUIsolationForest(
+                n_estimators=100,
+                max_samples=256,
+                contamination=0.1,  # Same offset as the CPU forest, so decision_function < 0 matches
+                random_state=42
+            )
+        
+        return IsolationForest(
+            n_estimators=100,
+            max_samples=256,  # Subsample size recommended by the original paper
+            contamination=0.1,  # 10% expected anomalies
+            n_jobs=-1,  # Build trees in parallel across all cores
+            random_state=42
+        )
+
+    def train_anomaly_model(self, features, persist=True):
+        """
+        Fit the scaler and Isolation Forest, optionally persisting them to disk
+        
+        Args:
+            features (np.ndarray): float32 feature matrix with FEATURE_COLUMNS columns
+            persist (bool): Save the fitted model so later runs can reuse it
+        """
+        scaler = MaxAbsScaler()
+        isolation_forest = self._create_isolation_forest()
+        isolation_forest.fit(scaler.fit_transform(features))
+        
+        # Swap in the fitted pair as one unit so a scan never mixes scaler and forest
+        self.anomaly_model = (scaler, isolation_forest)
+        self._bootstrap_model = not persist
+        
+        if persist:
+            model_file = self.config.get('model_file', 'iforest.joblib')
+            tmp_file = model_file + '.tmp'
+            try:
+                # Write atomically so a crash mid-save never leaves a corrupt model file
+                with self._model_save_lock:
+                    joblib.dump({'isolation_forest': isolation_forest, 'scaler': scaler}, tmp_file)
+                    os.replace(tmp_file, model_file)
+            except Exception as e:
+                self.logger.error(f"Anomaly model save failed: {e}")
+
+    def _training_history(self):
+        """
+        Stack the recent scan history into a single training matrix
+        
+        Returns:
+            np.ndarray: float32 feature matrix, or None if there is no history yet
+        """
+        # list() copies the deque atomically, so concurrent scans can keep appending
+        history = list(self._feature_history)
+        return np.vstack(history) if history else None
+
+    def start_model_retraining(self, interval=24 * 60 * 60):
+        """
+        Periodically retrain the anomaly model on recent scan history
+        
+        Args:
+            interval (int): Seconds between retraining runs
+        """
+        def periodic_model_update():
+            while True:
+                try:
+                    # Train first, then sleep; short histories are left to the bootstrap path
+                    history = self._training_history()
+                    if (self.anomaly_detection_enabled and history is not None
+                            and len(history) >= MIN_TRAINING_ROWS):
+                        self.train_anomaly_model(history)
+                        self.logger.info("Anomaly model retrained")
+                except Exception as e:
+                    self.logger.error(f"Anomaly model retraining failed: {e}")
+                time.sleep(interval)  # Retrain daily by default
+        
+        model_thread = threading.Thread(target=periodic_model_update, daemon=True)
+        model_thread.start()
 
     def _build_lstm_autoencoder(self):
         """
@@ -140,13 +293,14 @@ class AdvancedMLDeviceTracker:
         """
         model = Sequential([
             # Encoder
-            LSTM(64, activation='relu', input_shape=(None, 5), return_sequences=True),
+            LSTM(64, activation='relu', input_shape=(LSTM_WINDOW, len(FEATURE_COLUMNS)), return_sequences=True),
             LSTM(32, activation='relu'),
             
             # Decoder
+            RepeatVector(LSTM_WINDOW),
             Dense(32, activation='relu'),
             Dense(64, activation='relu'),
-            Dense(5)  # Match input feature dimension
+            Dense(len(FEATURE_COLUMNS))  # Match input feature dimension
         ])
         
         model.compile(optimizer='adam', loss='mse')
@@ -218,40 +372,84 @@ class AdvancedMLDeviceTracker:
         except Exception as e:
             self.logger.error(f"Web Interface Setup Failed: {e}")
 
-    def detect_network_anomalies(self, network_data):
+    def detect_network_anomalies(self, ips, features):
         """
         Advanced anomaly detection using multiple ML techniques
         
         Args:
-            network_data (pd.DataFrame): Network activity data
+            ips (np.ndarray): Device IP addresses, one per feature row
+            features (np.ndarray): Feature matrix with FEATURE_COLUMNS columns (converted to float32)
         
         Returns:
             List of detected anomalies
         """
         anomalies = []
         
+        # float32 halves memory traffic during tree traversal
+        features = np.asarray(features, dtype=np.float32)
+        
+        self._feature_history.append(features)
+        
+        scaler = None
+        
         # Isolation Forest Anomaly Detection
-        if self.isolation_forest:
-            scaler = StandardScaler()
-            scaled_data = scaler.fit_transform(network_data)
+        if self.anomaly_detection_enabled:
+            if self._bootstrap_model:
+                # Until enough history exists, refit an in-memory model on it each
+                # scan; only a model trained on MIN_TRAINING_ROWS rows is saved
+                history = self._training_history()
+                self.train_anomaly_model(history, persist=len(history) >= MIN_TRAINING_ROWS)
+            
+            scaler, isolation_forest = self.anomaly_model
+            scaled_data = scaler.transform(features)
             
-            # Predict anomalies
-            anomaly_scores = self.isolation_forest.score_samples(scaled_data)
-            anomaly_mask = anomaly_scores < self.config['ml_anomaly_threshold']
+            # Predict anomalies; negative decision scores fall in the
+            # contamination fraction the forest was configured with
+            anomaly_scores = isolation_forest.decision_function(scaled_data)
+            anomaly_idxs = np.flatnonzero(anomaly_scores < 0)
             
-            anomalies.extend(network_data[anomaly_mask].to_dict('records'))
+            # Include the score so downstream triage can rank anomalies
+            anomalies.extend([
+                {'ip': ips[i], 'score': float(anomaly_scores[i]), 'features': features[i].tolist()}
+                for i in anomaly_idxs
+            ])
         
         # LSTM Autoencoder for Deep Anomaly Detection
         if self.lstm_model:
-            # Prepare data for LSTM (requires specific reshaping)
-            lstm_input = network_data.values.reshape((1, -1, network_data.shape[1]))
-            reconstruction_error = self.lstm_model.evaluate(lstm_input, lstm_input)
+            # Slide every window forward one scan and append this scan's raw summary
+            self._ring[:-1] = self._ring[1:]
+            self._ring[-1, :-1] = self._ring[-2, 1:]
+            self._ring[-1, -1] = features.mean(axis=0)
+            self._ring_scans += 1
             
-            if reconstruction_error > self.config['ml_anomaly_threshold']:
+            # Scale every window with the current scaler so all windows stay
+            # comparable across retrains (MaxAbs scaling commutes with the mean)
+            lstm_input = self._ring
+            if scaler is not None:
+                lstm_input = scaler.transform(self._ring.reshape(-1, self._ring.shape[-1]))
+                lstm_input = lstm_input.reshape(self._ring.shape).astype(np.float32, copy=False)
+            
+            # Score all windows in one batched inference call
+            reconstruction = self._lstm_infer(lstm_input).numpy()
+            reconstruction_errors = np.mean((reconstruction - lstm_input) ** 2, axis=(1, 2))
+            
+            # Window k ends at scan number first_scan + k. A window is reported the
+            # first time it crosses the threshold (e.g. as the newest window, or
+            # after a retrain rescales older ones) and never again
+            first_scan = self._ring_scans - LSTM_BATCH + 1
+            for k in np.flatnonzero(reconstruction_errors > self.config['ml_anomaly_threshold']):
+                window_end = first_scan + k
+                if window_end < LSTM_WINDOW or window_end in self._reported_windows:
+                    continue  # Not yet made entirely of real scans, or already reported
+                self._reported_windows.add(window_end)
                 anomalies.append({
                     'type': 'deep_learning_anomaly',
-                    'error': reconstruction_error
+                    'scans_ago': LSTM_BATCH - 1 - int(k),
+                    'error': float(reconstruction_errors[k])
                 })
+            
+            # Forget windows that have slid out of the ring
+            self._reported_windows = {w for w in self._reported_windows if w >= first_scan}
         
         return anomalies
 
@@ -281,14 +479,15 @@ class AdvancedMLDeviceTracker:
 def main():
     # Initialize Advanced ML Device Tracker
     tracker = AdvancedMLDeviceTracker()
+    tracker.start_model_retraining()
     
     # Continuous monitoring and anomaly detection
     while True:
         # Perform network scan and collect data
-        network_data = perform_network_scan()
+        ips, features = perform_network_scan()
         
         # Detect anomalies
-        anomalies = tracker.detect_network_anomalies(network_data)
+        anomalies = tracker.detect_network_anomalies(ips, features)
         
         # Send notifications if anomalies detected
         if anomalies:
@@ -299,20 +498,19 @@ def main():
 
 def perform_network_scan():
     """
-    Perform network scan and return pandas DataFrame
+    Perform network scan and return device IPs with their feature matrix
     
     Returns:
-        pd.DataFrame: Network activity data
+        tuple: (np.ndarray of device IPs, float32 np.ndarray of FEATURE_COLUMNS)
     """
     # Placeholder for actual network scanning logic
     # Returns structured data for ML analysis
-    return pd.DataFrame({
-        'device_ip': ['192.168.1.100', '192.168.1.101'],
-        'packets_sent': [100, 50],
-        'packets_received': [80, 40],
-        'unique_connections': [5, 3],
-        'avg_connection_time': [10.5, 8.2]
-    })
+    ips = np.array(['192.168.1.100', '192.168.1.101'])
+    features = np.array([
+        [100, 80, 5, 10.5],
+        [50, 40, 3, 8.2]
+    ], dtype=np.float32)
+    return ips, features
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,75 +3,193 @@ import time
 import json
 import platform
 import subprocess
+import atexit
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional fast JSON serializer
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional native ICMP support
+try:
+    import icmplib
+except ImportError:
+    icmplib = None
+
+# Optional raw ARP scanning support
+try:
+    from scapy.all import ARP, Ether, srp
+    from scapy.error import Scapy_Exception
+except ImportError:
+    srp = None
+
+# Host OS is fixed for the life of the process, so resolve it once
+_SYSTEM = platform.system().lower()
+_IS_WINDOWS = _SYSTEM == 'windows'
+_PING_FLAG = '-n' if _IS_WINDOWS else '-c'
+
+# Matches "<ip>  <mac>  <type>" rows in Windows `arp -a` output
+_ARP_RE = re.compile(r'^\s*([\d.]+)\s+([-0-9a-f]{17})\s+(\w+)', re.M)
+
+# Matches an nmap host report together with its "MAC Address:" line
+_NMAP_RE = re.compile(
+    r'^Nmap scan report for (?:\S+ \()?([\d.]+)\)?$'
+    r'(?:\n(?!Nmap scan report).*)*?'
+    r'\nMAC Address: ([0-9A-Fa-f:]{17})',
+    re.M
+)
+
+def _dump_record(record):
+    """
+    Serialize a log record to a single JSON line
+    
+    Args:
+        record (dict): Record to serialize
+    
+    Returns:
+        bytes: UTF-8 encoded JSON line
+    """
+    if orjson is not None:
+        return orjson.dumps(record) + b'\n'
+    return (json.dumps(record) + '\n').encode('utf-8')
 
 class DeviceTracker:
-    def __init__(self, log_file='device_log.txt'):
+    def __init__(self, log_file='device_log.txt', location_tracker=None, subnet='192.168.1.0/24',
+                 scan_cache_ttl=10):
         """
         Initialize Device Tracker with logging and device tracking capabilities
         
         Args:
             log_file (str): Path to log file for storing device information
+            location_tracker (LocationTracker): Optional tracker used to geolocate discovered devices
+            subnet (str): Local network to scan, in CIDR notation
+            scan_cache_ttl (int): Seconds a network scan result is reused
         """
         self.log_file = log_file
+        self.location_tracker = location_tracker
+        self.subnet = subnet
+        self.scan_cache_ttl = scan_cache_ttl
+        self._scan_cache = (0.0, [])
         self.tracked_devices = []
+        self._tracked_keys = set()  # IPs and MACs of tracked devices
         self.device_logs = []
 
+        # Keep the log file open for the tracker's lifetime instead of reopening per record
+        self._log_fp = open(self.log_file, 'ab', buffering=65536)
+
+        # Unprivileged ICMP sockets may be disallowed; switched off on first refusal
+        self._use_icmplib = icmplib is not None
+        atexit.register(self.close)
+
+    def close(self):
+        """
+        Flush and close the device log file
+        """
+        if not self._log_fp.closed:
+            self._log_fp.flush()
+            self._log_fp.close()
+
     def detect_network_devices(self):
         """
         Detect devices on the local network using different methods based on OS
         
+        Devices get a 'location' entry only when the location tracker resolves
+        their IP; private LAN addresses are never geolocated.
+        
         Returns:
             list: Discovered network devices with their details
         """
-        system = platform.system().lower()
+        # Reuse a recent scan so bursts of lookups don't rescan the network
+        scanned_at, cached_devices = self._scan_cache
+        if time.time() - scanned_at < self.scan_cache_ttl:
+            return cached_devices
+
         discovered_devices = []
 
         try:
-            if system == 'windows':
+            if _IS_WINDOWS:
                 # Windows: Use arp -a command
                 output = subprocess.check_output(['arp', '-a'], 
                                                 universal_newlines=True)
-                lines = output.split('\n')
-                for line in lines[3:]:
-                    parts = line.split()
-                    if len(parts) >= 3:
-                        discovered_devices.append({
-                            'ip': parts[0],
-                            'mac': parts[1],
-                            'type': parts[2] if len(parts) > 2 else 'Unknown'
-                        })
-
-            elif system in ['linux', 'darwin']:  # Linux or macOS
-                # Use nmap for network discovery
-                try:
-                    # Scan local network (assumes 192.168.1.0/24 subnet - modify as needed)
-                    output = subprocess.check_output(['nmap', '-sn', '192.168.1.0/24'], 
-                                                        universal_newlines=True)
-                    # Parse nmap output (this is a simplified parsing)
-                    lines = output.split('\n')
-                    for line in lines:
-                        if 'Nmap scan report for' in line:
-                            ip = line.split()[-1]
-                        elif 'MAC Address:' in line:
-                            mac = line.split('MAC Address: ')[1].split()[0]
-                            discovered_devices.append({
-                                'ip': ip,
-                                'mac': mac,
-                                'type': 'Unknown'
-                            })
-                except FileNotFoundError:
-                    print("Nmap not installed. Please install nmap for network scanning.")
+                discovered_devices = [
+                    {'ip': m[1], 'mac': m[2], 'type': m[3]}
+                    for m in _ARP_RE.finditer(output)
+                ]
+
+            elif _SYSTEM in ['linux', 'darwin']:  # Linux or macOS
+                # Prefer a single broadcast ARP scan, fall back to nmap
+                arp_devices = self._arp_scan() if srp is not None else None
+                if arp_devices is not None:
+                    discovered_devices = arp_devices
+                else:
+                    discovered_devices = self._nmap_scan()
 
             else:
-                print(f"Unsupported OS: {system}")
+                print(f"Unsupported OS: {_SYSTEM}")
                 return []
 
+            # Geolocate all discovered devices with a single batch lookup
+            if self.location_tracker and discovered_devices:
+                locations = self.location_tracker.get_ip_locations(
+                    [device['ip'] for device in discovered_devices]
+                )
+                for device in discovered_devices:
+                    if device['ip'] in locations:
+                        device['location'] = locations[device['ip']]
+
+            self._scan_cache = (time.time(), discovered_devices)
             return discovered_devices
 
         except Exception as e:
             print(f"Error detecting network devices: {e}")
             return []
 
+    def _arp_scan(self):
+        """
+        Discover devices with a single broadcast ARP request
+        
+        Returns:
+            list: Discovered devices, or None if the scan could not run (e.g. missing privileges)
+        """
+        try:
+            answered, _ = srp(
+                Ether(dst='ff:ff:ff:ff:ff:ff') / ARP(pdst=self.subnet),
+                timeout=2,
+                verbose=0
+            )
+        except (OSError, Scapy_Exception) as e:
+            # Raw sockets (Linux) or /dev/bpf* (macOS) need privileges
+            print(f"ARP scan unavailable ({e}), falling back to nmap.")
+            return None
+
+        return [
+            {'ip': reply.psrc, 'mac': reply.hwsrc, 'type': 'Unknown'}
+            for _, reply in answered
+        ]
+
+    def _nmap_scan(self):
+        """
+        Discover devices with an nmap ping sweep
+        
+        Returns:
+            list: Discovered devices
+        """
+        discovered_devices = []
+        try:
+            output = subprocess.check_output(['nmap', '-sn', self.subnet], 
+                                             universal_newlines=True)
+            discovered_devices = [
+                {'ip': m[1], 'mac': m[2], 'type': 'Unknown'}
+                for m in _NMAP_RE.finditer(output)
+            ]
+        except FileNotFoundError:
+            print("Nmap not installed. Please install nmap for network scanning.")
+        return discovered_devices
+
     def add_device_to_track(self, device_identifier):
         """
         Add a specific device to track
@@ -85,7 +203,7 @@ class DeviceTracker:
             return False
 
         # Check if device is already being tracked
-        if device_identifier in [d.get('ip') or d.get('mac') for d in self.tracked_devices]:
+        if device_identifier in self._tracked_keys:
             print("Device is already being tracked")
             return False
 
@@ -99,12 +217,142 @@ class DeviceTracker:
 
         if matching_device:
             self.tracked_devices.append(matching_device)
+            self._tracked_keys.update([matching_device['ip'], matching_device['mac']])
             print(f"Added device to tracking: {matching_device}")
             return True
         else:
             print(f"Could not find device {device_identifier} on network")
             return False
 
+    def _ping_device(self, ip):
+        """
+        Ping a device to check connectivity
+        
+        Sends a single ICMP echo through icmplib when available, otherwise
+        (or when the host refuses unprivileged ICMP sockets) falls back to
+        the system ping command.
+        
+        Args:
+            ip (str): IP address of the device
+        
+        Returns:
+            bool: True if the device responded
+        """
+        if self._use_icmplib:
+            try:
+                return icmplib.ping(ip, count=1, timeout=1, privileged=False).is_alive
+            except icmplib.SocketPermissionError:
+                self._use_icmplib = False
+
+        output = subprocess.run(
+            ['ping', _PING_FLAG, '1', ip], 
+            capture_output=True, 
+            text=True
+        )
+        return output.returncode == 0
+
+    async def _ping_device_async(self, ip):
+        """
+        Ping a device without blocking the event loop
+        
+        Args:
+            ip (str): IP address of the device
+        
+        Returns:
+            bool: True if the device responded
+        """
+        if self._use_icmplib:
+            try:
+                host = await icmplib.async_ping(ip, count=1, timeout=1, privileged=False)
+                return host.is_alive
+            except icmplib.SocketPermissionError:
+                self._use_icmplib = False
+
+        process = await asyncio.create_subprocess_exec(
+            'ping', _PING_FLAG, '1', ip,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        return await process.wait() == 0
+
+    def _build_status(self, device, online):
+        """
+        Build a device status record
+        
+        Args:
+            device (dict): Device information
+            online (bool): Whether the device responded
+        
+        Returns:
+            dict: Device status
+        """
+        return {
+            'timestamp': time.time(),
+            'ip': device['ip'],
+            'mac': device.get('mac', 'Unknown'),
+            'online': online
+        }
+
+    def _log_statuses(self, statuses):
+        """
+        Record device statuses and write them to the log file in one call
+        
+        Args:
+            statuses (list): Device status records
+        """
+        # Log device status
+        self.device_logs.extend(statuses)
+        
+        # Write to log file
+        self._log_fp.writelines(_dump_record(status) for status in statuses)
+
+        for status in statuses:
+            print(f"Device {status['ip']} status: {'Online' if status['online'] else 'Offline'}")
+
+    def _probe_once(self, device):
+        """
+        Ping a device once and build its status record
+        
+        Args:
+            device (dict): Device information
+        
+        Returns:
+            dict: Device status, or None if the probe failed
+        """
+        try:
+            return self._build_status(device, self._ping_device(device['ip']))
+        except Exception as e:
+            print(f"Error tracking device {device['ip']}: {e}")
+            return None
+
+    def track_devices(self, devices, interval=60, duration=3600):
+        """
+        Track several devices, probing all of them in parallel each interval
+        
+        Args:
+            devices (list): Device information for each device to track
+            interval (int): Time between checks in seconds
+            duration (int): Total tracking time in seconds
+        """
+        if not devices:
+            print("No devices to track")
+            return
+
+        start_time = time.time()
+        print(f"Starting tracking for {len(devices)} devices")
+
+        with ThreadPoolExecutor(max_workers=min(32, len(devices))) as executor:
+            while time.time() - start_time < duration:
+                statuses = [status for status in executor.map(self._probe_once, devices) if status]
+
+                # Log all statuses from this round in one write
+                self._log_statuses(statuses)
+
+                # Wait before next check
+                time.sleep(interval)
+
+        self._log_fp.flush()
+
     def track_device(self, device, interval=60, duration=3600):
         """
         Track a specific device's network presence
@@ -119,36 +367,50 @@ class DeviceTracker:
 
         while time.time() - start_time < duration:
             try:
-                # Ping the device to check connectivity
-                param = '-n' if platform.system().lower() == 'windows' else '-c'
-                output = subprocess.run(
-                    ['ping', param, '4', device['ip']], 
-                    capture_output=True, 
-                    text=True
-                )
+                self._log_statuses([self._build_status(device, self._ping_device(device['ip']))])
+            except Exception as e:
+                print(f"Error tracking device {device['ip']}: {e}")
 
-                # Check ping result
-                device_status = {
-                    'timestamp': time.time(),
-                    'ip': device['ip'],
-                    'mac': device.get('mac', 'Unknown'),
-                    'online': output.returncode == 0
-                }
+            # Wait before next check
+            time.sleep(interval)
 
-                # Log device status
-                self.device_logs.append(device_status)
-                
-                # Write to log file
-                with open(self.log_file, 'a') as f:
-                    f.write(json.dumps(device_status) + '\n')
+        self._log_fp.flush()
 
-                print(f"Device {device['ip']} status: {'Online' if device_status['online'] else 'Offline'}")
+    async def track_device_async(self, device, interval=60, duration=3600):
+        """
+        Track a device's network presence as a coroutine
+        
+        Args:
+            device (dict): Device information
+            interval (int): Time between checks in seconds
+            duration (int): Total tracking time in seconds
+        """
+        start_time = time.time()
+        print(f"Starting tracking for device: {device}")
 
+        while time.time() - start_time < duration:
+            try:
+                online = await self._ping_device_async(device['ip'])
+                self._log_statuses([self._build_status(device, online)])
             except Exception as e:
                 print(f"Error tracking device {device['ip']}: {e}")
 
             # Wait before next check
-            time.sleep(interval)
+            await asyncio.sleep(interval)
+
+    async def track_all_devices_async(self, interval=60, duration=3600):
+        """
+        Track every tracked device concurrently on a single event loop
+        
+        Args:
+            interval (int): Time between checks in seconds
+            duration (int): Total tracking time in seconds
+        """
+        await asyncio.gather(*[
+            self.track_device_async(device, interval, duration)
+            for device in self.tracked_devices
+        ])
+        self._log_fp.flush()
 
     def display_tracking_summary(self):
         """
@@ -191,5 +453,7 @@ def main():
         # Display tracking summary
         tracker.display_tracking_summary()
 
+    tracker.close()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file